@@ -11,25 +11,159 @@ Environment variables:
     FRAPPE_API_SECRET: Frappe API secret
     MCP_DEBUG: Set to '1' for debug logging
     MCP_TIMEOUT: Request timeout in seconds (default: 10)
+    MCP_CACHE_TTL: Seconds to cache discovery responses, 0 disables (default: 60)
+    MCP_BATCH: Set to '0' to disable JSON-RPC batch coalescing (default: on)
 
 Based on the stdio bridge from Frappe Assistant Core by Paul Clinton.
 License: MIT
 """
 
+import asyncio
+import functools
 import json
 import os
 import sys
-import threading
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, Optional, Tuple
 
-import requests
+import httpx
+
+# Fastest available JSON backend: msgspec, then orjson, then stdlib.
+# Both accelerated decoders raise ValueError subclasses on bad input,
+# matching json.JSONDecodeError for the callers.
+try:
+    import msgspec.json
+
+    _decoder = msgspec.json.Decoder()
+    _encoder = msgspec.json.Encoder()
+
+    def _loads(data: Any) -> Any:
+        return _decoder.decode(data)
+
+    def _dumps(obj: Any) -> bytes:
+        return _encoder.encode(obj)
+
+except ImportError:
+    try:
+        import orjson
+
+        def _loads(data: Any) -> Any:
+            return orjson.loads(data)
+
+        def _dumps(obj: Any) -> bytes:
+            return orjson.dumps(obj)
+
+    except ImportError:
+
+        def _loads(data: Any) -> Any:
+            return json.loads(data)
+
+        def _dumps(obj: Any) -> bytes:
+            return json.dumps(obj).encode("utf-8")
+
+
+# Idempotent discovery methods whose responses are stable for a session.
+# Interned so membership tests against interned incoming methods are
+# pointer compares ("a/b" literals are not auto-interned by CPython).
+_CACHEABLE_METHODS = frozenset(
+    map(sys.intern, ("tools/list", "prompts/list", "resources/list"))
+)
+
+
+# Leading bytes of the usual success response: Frappe's {"message": ...}
+# wrapper around a complete JSON-RPC envelope
+_FAST_ENVELOPE = b'{"message":{"jsonrpc":"2.0"'
+
+
+@functools.lru_cache(maxsize=32)
+def _error_skeleton(code: int, message: str) -> Dict:
+    """Cached envelope for a (code, message) pair.
+
+    Errors reuse a handful of pairs (timeout, connection failed, parse
+    error), so the skeleton is built once per pair. Callers must treat
+    the returned dict as immutable.
+    """
+    return {"jsonrpc": "2.0", "error": {"code": code, "message": message}}
+
+
+class _ExecutorStdinReader:
+    """Line reader for platforms where stdin can't join the event loop.
+
+    Mirrors the StreamReader.readline interface used by the read loop,
+    running the blocking read in the loop's default executor.
+    """
+
+    __slots__ = ("_loop",)
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    async def readline(self) -> bytes:
+        return await self._loop.run_in_executor(None, sys.stdin.buffer.readline)
+
+
+class _StreamStdinReader:
+    """Unbounded line reader over an asyncio StreamReader.
+
+    StreamReader.readline raises once a line outgrows its buffer limit,
+    which would turn one oversized (but valid) request into a fatal
+    crash. Here the limit is only the chunk granularity: on overflow the
+    buffered bytes are drained and accumulated until the newline shows
+    up, so there is no practical cap on message size — same as the
+    executor fallback reader.
+    """
+
+    __slots__ = ("_reader",)
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self._reader = reader
+
+    async def readline(self) -> bytes:
+        reader = self._reader
+        chunks = []
+        while True:
+            try:
+                chunk = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                chunk = e.partial  # EOF
+            except asyncio.LimitOverrunError as e:
+                chunks.append(await reader.read(e.consumed))
+                continue
+            if not chunks:
+                return chunk
+            chunks.append(chunk)
+            return b"".join(chunks)
 
 
 class ERPNextMCPBridge:
     """Stdio bridge between MCP clients and Frappe Assistant Core."""
 
+    __slots__ = (
+        "server_url",
+        "api_key",
+        "api_secret",
+        "timeout",
+        "debug",
+        "cache_ttl",
+        "batching",
+        "headers",
+        "endpoint_url",
+        "client",
+        "output_lock",
+        "_out",
+        "_cache",
+        "_local_templates",
+        "_sem",
+        "_inflight",
+        "_pending",
+        "_flush_task",
+        "_batch_supported",
+    )
+
     MCP_ENDPOINT = "/api/method/frappe_assistant_core.api.fac_endpoint.handle_mcp"
+    MAX_IN_FLIGHT = 5
+    BATCH_WINDOW = 0.002  # seconds to wait for more requests to coalesce
+    BATCH_MAX = 16
 
     def __init__(self):
         self.server_url = os.environ.get("FRAPPE_SERVER_URL", "").rstrip("/")
@@ -37,6 +171,8 @@ class ERPNextMCPBridge:
         self.api_secret = os.environ.get("FRAPPE_API_SECRET", "")
         self.timeout = int(os.environ.get("MCP_TIMEOUT", "10"))
         self.debug = os.environ.get("MCP_DEBUG", "") == "1"
+        self.cache_ttl = float(os.environ.get("MCP_CACHE_TTL", "60"))
+        self.batching = os.environ.get("MCP_BATCH", "1") != "0"
 
         if not self.server_url:
             self._fatal("FRAPPE_SERVER_URL environment variable is required")
@@ -49,8 +185,38 @@ class ERPNextMCPBridge:
         }
 
         self.endpoint_url = f"{self.server_url}{self.MCP_ENDPOINT}"
-        self.executor = ThreadPoolExecutor(max_workers=5)
-        self.output_lock = threading.Lock()
+        self._out = sys.stdout.buffer
+        self._cache: Dict[str, Tuple[float, Dict]] = {}
+
+        # Dispatch table of serialized local responses, minus the closing
+        # brace so the request id can be spliced in without re-encoding.
+        self._local_templates: Dict[str, bytes] = {
+            sys.intern("initialize"): _dumps(
+                {
+                    "jsonrpc": "2.0",
+                    "result": {
+                        "protocolVersion": "2025-03-26",
+                        "capabilities": {"tools": {}, "prompts": {}},
+                        "serverInfo": {"name": "erpnext-fac", "version": "1.0.0"},
+                    },
+                }
+            )[:-1],
+            sys.intern("resources/list"): _dumps(
+                {"jsonrpc": "2.0", "result": {"resources": []}}
+            )[:-1],
+        }
+
+        # Created inside the event loop in _arun
+        self.client: Optional[httpx.AsyncClient] = None
+        self.output_lock: Optional[asyncio.Lock] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+        # Batch coalescing state; _batch_supported is None until the
+        # first batch POST probes whether the server accepts arrays.
+        self._inflight = 0
+        self._pending: list = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._batch_supported: Optional[bool] = None
 
     def _fatal(self, message: str):
         print(f"FATAL: {message}", file=sys.stderr, flush=True)
@@ -63,15 +229,22 @@ class ERPNextMCPBridge:
     def _log_error(self, message: str):
         print(f"ERROR: {message}", file=sys.stderr, flush=True)
 
+    async def _write_payload(self, payload: bytes):
+        """Write a newline-framed payload to stdout as raw bytes."""
+        async with self.output_lock:
+            self._out.write(payload + b"\n")
+            self._out.flush()
+
+    async def _write_response(self, response: Dict):
+        await self._write_payload(_dumps(response))
+
     def _error_response(
         self, code: int, message: str, data: Any = None, req_id: Any = None
     ) -> Dict:
-        resp: Dict[str, Any] = {
-            "jsonrpc": "2.0",
-            "error": {"code": code, "message": message},
-        }
+        skeleton = _error_skeleton(code, message)
+        resp: Dict[str, Any] = dict(skeleton)
         if data is not None:
-            resp["error"]["data"] = data
+            resp["error"] = {**skeleton["error"], "data": data}
         if req_id is not None:
             resp["id"] = req_id
         return resp
@@ -79,6 +252,13 @@ class ERPNextMCPBridge:
     def _validate_response(self, response: Any, req_id: Any = None) -> Dict:
         if not isinstance(response, dict):
             return {"jsonrpc": "2.0", "id": req_id, "result": response}
+        # Fast path: a well-formed envelope passes through untouched
+        if response.get("jsonrpc") == "2.0" and (
+            "result" in response or "error" in response
+        ):
+            if req_id is not None and "id" not in response:
+                response["id"] = req_id
+            return response
         if "jsonrpc" not in response:
             response["jsonrpc"] = "2.0"
         if req_id is not None and "id" not in response:
@@ -87,19 +267,34 @@ class ERPNextMCPBridge:
             return {"jsonrpc": "2.0", "id": req_id, "result": response}
         return response
 
-    def _send_to_server(self, request_data: Dict) -> Dict:
-        """Forward request to Frappe Assistant Core MCP endpoint."""
+    async def _post_single(
+        self, request_data: Dict, raw: Optional[bytes] = None
+    ) -> Dict:
+        """POST one request to the Frappe Assistant Core MCP endpoint.
+
+        The bridge never rewrites requests, so when the original stdin
+        line is available it goes out as the body verbatim instead of
+        being re-serialized from the parsed dict.
+        """
         req_id = request_data.get("id")
         try:
             self._log(f">> {request_data.get('method')} (id={req_id})")
-            resp = requests.post(
+            resp = await self.client.post(
                 self.endpoint_url,
-                headers=self.headers,
-                json=request_data,
-                timeout=self.timeout,
+                content=raw if raw is not None else _dumps(request_data),
             )
             if resp.status_code == 200:
-                result = resp.json()
+                content = resp.content
+                # Fast path: wrapped, well-formed envelope; one parse,
+                # one dict index, no generic validation walk
+                if content.startswith(_FAST_ENVELOPE):
+                    result = _loads(content)["message"]
+                    if "result" in result or "error" in result:
+                        if req_id is not None and "id" not in result:
+                            result["id"] = req_id
+                        return result
+                    return self._validate_response(result, req_id)
+                result = _loads(content)
                 # Frappe wraps responses in {"message": ...}
                 if isinstance(result, dict) and "message" in result:
                     return self._validate_response(result["message"], req_id)
@@ -112,10 +307,10 @@ class ERPNextMCPBridge:
                     resp.text[:500],
                     req_id,
                 )
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             self._log_error("Request timed out")
             return self._error_response(-32001, "Request timed out", None, req_id)
-        except requests.exceptions.ConnectionError:
+        except httpx.TransportError:
             self._log_error(f"Cannot connect to {self.server_url}")
             return self._error_response(
                 -32603, "Connection failed", f"Cannot reach {self.server_url}", req_id
@@ -124,93 +319,330 @@ class ERPNextMCPBridge:
             self._log_error(f"Request failed: {e}")
             return self._error_response(-32603, "Internal error", str(e), req_id)
 
-    def _handle_local(self, request: Dict) -> Optional[Dict]:
-        """Handle requests that don't need to go to the server."""
-        method = request.get("method")
-        req_id = request.get("id")
+    async def _send_to_server(
+        self, request_data: Dict, raw: Optional[bytes] = None
+    ) -> Dict:
+        """Forward a request, coalescing concurrent calls into batches.
 
-        if method == "initialize":
-            resp: Dict[str, Any] = {
-                "jsonrpc": "2.0",
-                "result": {
-                    "protocolVersion": "2025-03-26",
-                    "capabilities": {"tools": {}, "prompts": {}},
-                    "serverInfo": {"name": "erpnext-fac", "version": "1.0.0"},
-                },
-            }
-            if req_id is not None:
-                resp["id"] = req_id
-            return resp
+        Requests arriving within BATCH_WINDOW of each other are sent as
+        one JSON-RPC array POST and demultiplexed by id. A lone request
+        with nothing else in flight — the normal serial client pattern —
+        posts immediately rather than paying the window. Notifications
+        and servers that reject arrays use the single-request path.
+        """
+        req_id = request_data.get("id")
+        if (
+            not self.batching
+            or self._batch_supported is False
+            or req_id is None
+            or (self._inflight <= 1 and not self._pending)
+        ):
+            return await self._post_single(request_data, raw)
 
-        if method == "resources/list":
-            resp = {"jsonrpc": "2.0", "result": {"resources": []}}
-            if req_id is not None:
-                resp["id"] = req_id
-            return resp
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending.append((request_data, raw, fut))
+        if len(self._pending) >= self.BATCH_MAX:
+            await self._flush_batch()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+        return await fut
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.BATCH_WINDOW)
+        await self._flush_batch()
+
+    async def _flush_batch(self):
+        """Send everything queued in the current coalescing window."""
+        self._flush_task = None
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
 
-        return None  # Not handled locally
+        if len(pending) == 1:
+            request_data, raw, fut = pending[0]
+            result = await self._post_single(request_data, raw)
+            if not fut.done():
+                fut.set_result(result)
+            return
 
-    def _process_request(self, request: Dict):
+        await self._post_batch(pending)
+
+    async def _post_batch(self, pending: list):
+        """POST a JSON-RPC array and resolve each request's future."""
+        body = b"[" + b",".join(
+            raw if raw is not None else _dumps(req) for req, raw, _ in pending
+        ) + b"]"
+        self._log(f">> batch of {len(pending)}")
+        # Everything through the demux runs inside the try: this method
+        # is awaited from a fire-and-forget flush task, so an escaped
+        # exception (e.g. a 200 with a non-JSON body) would leave every
+        # future unresolved and wedge the bridge.
+        try:
+            resp = await self.client.post(self.endpoint_url, content=body)
+            if resp.status_code == 200:
+                result = _loads(resp.content)
+                if isinstance(result, dict) and "message" in result:
+                    result = result["message"]
+                if isinstance(result, list):
+                    self._batch_supported = True
+                    by_id = {
+                        item["id"]: item
+                        for item in result
+                        if isinstance(item, dict) and "id" in item
+                    }
+                    for req, _, fut in pending:
+                        rid = req.get("id")
+                        item = by_id.get(rid)
+                        if item is None:
+                            item = self._error_response(
+                                -32603, "No response in batch", None, rid
+                            )
+                        else:
+                            item = self._validate_response(item, rid)
+                        if not fut.done():
+                            fut.set_result(item)
+                    return
+        except httpx.TimeoutException:
+            self._log_error("Batch request timed out")
+            for req, _, fut in pending:
+                if not fut.done():
+                    fut.set_result(
+                        self._error_response(
+                            -32001, "Request timed out", None, req.get("id")
+                        )
+                    )
+            return
+        except Exception as e:
+            self._log_error(f"Batch request failed: {e}")
+            for req, _, fut in pending:
+                if not fut.done():
+                    fut.set_result(
+                        self._error_response(
+                            -32603, "Internal error", str(e), req.get("id")
+                        )
+                    )
+            return
+
+        # Anything other than an array reply means the server doesn't
+        # speak batches (Frappe may answer an array body with 4xx, 5xx
+        # or a plain object). Stop trying for this session so later
+        # bursts don't waste a probe round trip or risk re-executing
+        # partially processed requests, and replay this one singly.
+        self._batch_supported = False
+        self._log(
+            f"Server rejected batch (HTTP {resp.status_code}); using single requests"
+        )
+        for req, raw, fut in pending:
+            result = await self._post_single(req, raw)
+            if not fut.done():
+                fut.set_result(result)
+
+    def _handle_local(self, method: str, request: Dict) -> Optional[bytes]:
+        """Handle requests that don't need to go to the server.
+
+        Returns the serialized response payload, built by splicing the
+        request id into a precomputed template. Routing is a single dict
+        lookup rather than a chain of string compares.
+        """
+        template = self._local_templates.get(method)
+        if template is None:
+            return None  # Not handled locally
+
+        req_id = request.get("id")
+        if req_id is None:
+            return template + b"}"
+        return template + b',"id":' + _dumps(req_id) + b"}"
+
+    def _cached_response(self, method: str, request: Dict) -> Optional[Dict]:
+        """Return a fresh cached copy of a discovery response, if any."""
+        entry = self._cache.get(method)
+        if entry is None:
+            return None
+        stamp, template = entry
+        if time.monotonic() - stamp > self.cache_ttl:
+            del self._cache[method]
+            return None
+        # Template payloads are never mutated, so a shallow copy suffices
+        response = dict(template)
+        req_id = request.get("id")
+        if req_id is not None:
+            response["id"] = req_id
+        return response
+
+    def _cache_response(self, method: str, response: Dict):
+        """Store a successful discovery response, keyed by method."""
+        if "error" not in response:
+            template = {k: v for k, v in response.items() if k != "id"}
+            self._cache[method] = (time.monotonic(), template)
+
+    async def _process_request(self, request: Dict, raw: Optional[bytes] = None):
         """Process a single JSON-RPC request."""
         try:
             req_id = request.get("id")
-            method = request.get("method", "")
+            # Intern so the dict/set lookups below start as pointer compares
+            method = sys.intern(request.get("method") or "")
+
+            # Server state may have changed; drop cached discovery data
+            if method.startswith("notifications/") and self._cache:
+                self._cache.clear()
+
+            cacheable = (
+                self.cache_ttl > 0
+                and method in _CACHEABLE_METHODS
+                and not request.get("params")
+            )
 
-            # Try local handling first
-            response = self._handle_local(request)
+            # Try local handling first; local handlers return bytes
+            local = self._handle_local(method, request)
+            if local is not None:
+                if req_id is not None:
+                    await self._write_payload(local)
+                else:
+                    self._log(f"Notification: {method}")
+                return
+
+            response = self._cached_response(method, request) if cacheable else None
             if response is None:
                 # Forward to FAC server
-                response = self._send_to_server(request)
+                response = await self._send_to_server(request, raw)
+                if cacheable:
+                    self._cache_response(method, response)
 
             # Only respond if request had an id (not a notification)
             if req_id is not None:
-                with self.output_lock:
-                    print(json.dumps(response), flush=True)
+                await self._write_response(response)
             else:
                 self._log(f"Notification: {method}")
 
         except Exception as e:
             self._log_error(f"Error: {e}")
             if request.get("id") is not None:
-                with self.output_lock:
-                    print(
-                        json.dumps(
-                            self._error_response(
-                                -32603, str(e), None, request.get("id")
-                            )
-                        ),
-                        flush=True,
-                    )
+                await self._write_response(
+                    self._error_response(-32603, str(e), None, request.get("id"))
+                )
 
-    def run(self):
+    async def _stdin_reader(self):
+        """Bind a line reader to the raw stdin byte stream.
+
+        Lines come out as bytes and go straight into _loads, so no text
+        decode happens on the read path. The StreamReader limit is only
+        a chunk size; _StreamStdinReader reassembles lines of any
+        length above it.
+
+        On Windows the Proactor loop cannot wrap console or anonymous
+        pipe stdin in connect_read_pipe, so fall back to pumping the
+        blocking readline through the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=1 << 20)
+        protocol = asyncio.StreamReaderProtocol(reader)
+        try:
+            await loop.connect_read_pipe(lambda: protocol, sys.stdin.buffer)
+        except (NotImplementedError, OSError):
+            return _ExecutorStdinReader(loop)
+        return _StreamStdinReader(reader)
+
+    async def _warmup(self):
+        """Prime DNS and the TLS session before the first real request.
+
+        Claude's initialize otherwise pays the full lookup + handshake
+        cost. The keep-alive pool retains the warmed connection. Any
+        failure here is harmless; real requests will report their own.
+        """
+        try:
+            await self.client.get(
+                f"{self.server_url}/api/method/frappe.auth.get_logged_user",
+                timeout=3,
+            )
+            self._log("Warmup complete")
+        except Exception as e:
+            self._log(f"Warmup failed: {e}")
+
+    async def _run_request(self, request: Dict, raw: Optional[bytes] = None):
+        """Process one request, releasing the in-flight slot when done."""
+        self._inflight += 1
+        try:
+            await self._process_request(request, raw)
+        finally:
+            self._inflight -= 1
+            self._sem.release()
+
+    async def _arun(self):
         """Main stdio loop."""
         self._log(f"Bridge started -> {self.server_url}")
+        self.output_lock = asyncio.Lock()
+        self._sem = asyncio.Semaphore(self.MAX_IN_FLIGHT)
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=self.timeout,
+            # retries covers connect failures only; a failed POST still
+            # surfaces as a JSON-RPC error rather than being resent
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(
+                    max_connections=self.MAX_IN_FLIGHT,
+                    max_keepalive_connections=self.MAX_IN_FLIGHT,
+                ),
+            ),
+        )
+        tasks: set = set()
         try:
-            for line in sys.stdin:
+            warmup = asyncio.create_task(self._warmup())
+            tasks.add(warmup)
+            warmup.add_done_callback(tasks.discard)
+            reader = await self._stdin_reader()
+            # Bind hot names as locals to skip repeated global/attribute
+            # lookups on every iteration
+            loads = _loads
+            readline = reader.readline
+            create_task = asyncio.create_task
+            acquire = self._sem.acquire
+            run_request = self._run_request
+            discard = tasks.discard
+            while True:
+                line = await readline()
+                if not line:
+                    break
                 line = line.strip()
                 if not line:
                     continue
                 try:
-                    request = json.loads(line)
-                    self.executor.submit(self._process_request, request)
-                except json.JSONDecodeError as e:
+                    request = loads(line)
+                    # Blocks the read loop when MAX_IN_FLIGHT requests are
+                    # pending, so a fast client can't queue unboundedly.
+                    await acquire()
+                    task = create_task(run_request(request, line))
+                    tasks.add(task)
+                    task.add_done_callback(discard)
+                except ValueError as e:
                     self._log_error(f"Invalid JSON: {e}")
-                    print(
-                        json.dumps(
-                            self._error_response(-32700, "Parse error", str(e))
-                        ),
-                        flush=True,
+                    await self._write_response(
+                        self._error_response(-32700, "Parse error", str(e))
                     )
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            await self.client.aclose()
+
+    def run(self):
+        """Run the async stdio loop until stdin closes."""
+        try:
+            asyncio.run(self._arun())
         except KeyboardInterrupt:
             self._log("Stopped")
         except Exception as e:
             self._log_error(f"Fatal: {e}")
             sys.exit(1)
-        finally:
-            self.executor.shutdown(wait=True)
 
 
 def main():
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:  # optional; unavailable on Windows
+        pass
     bridge = ERPNextMCPBridge()
     bridge.run()
 
@@ -47,11 +47,12 @@ def find_bridge_command() -> str:
 def test_connection(url: str, key: str, secret: str) -> bool:
     """Test API connection."""
     try:
-        import requests
-        resp = requests.get(
+        import httpx
+        resp = httpx.get(
             f"{url}/api/method/frappe.auth.get_logged_user",
             headers={"Authorization": f"token {key}:{secret}"},
             timeout=10,
+            follow_redirects=True,
         )
         if resp.status_code == 200:
             user = resp.json().get("message", "unknown")
@@ -68,12 +69,13 @@ def test_connection(url: str, key: str, secret: str) -> bool:
 def test_mcp(url: str, key: str, secret: str) -> bool:
     """Test MCP endpoint."""
     try:
-        import requests
-        resp = requests.post(
+        import httpx
+        resp = httpx.post(
             f"{url}/api/method/frappe_assistant_core.api.fac_endpoint.handle_mcp",
             headers={"Authorization": f"token {key}:{secret}", "Content-Type": "application/json"},
             json={"jsonrpc": "2.0", "method": "tools/list", "id": 1, "params": {}},
             timeout=10,
+            follow_redirects=True,
         )
         if resp.status_code == 200:
             data = resp.json()